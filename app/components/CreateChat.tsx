@@ -20,6 +20,7 @@ import { Easing } from "react-native/Libraries/Animated/Easing";
 import PanResponder from "react-native/Libraries/Interaction/PanResponder";
 import { CustomIcon } from "../../components/ui/CustomIcon";
 import { WebView } from "react-native-webview";
+import EventSource from "react-native-sse";
 import { SafeAreaView, useSafeAreaInsets } from "react-native-safe-area-context";
 import { BlurView } from "expo-blur";
 import { LinearGradient } from "expo-linear-gradient";
@@ -79,6 +80,165 @@ const VOID_TAGS = new Set([
   "keygen","menuitem"
 ]);
 
+// Precompiled patterns for the linter, QA checks and protocol parsing.
+// Global (g) patterns are only used with match/replace or exec loops that
+// reset lastIndex first.
+const CODE_FENCE_RE = /^\s*```[a-zA-Z]*\s*|\s*```\s*$/gm;
+// Comments are skipped where they stand rather than stripped from a copy of
+// the document, so the doctype check allows for leading comments. A comment
+// body may not cross '-->', so each leading comment can only match one way.
+const DOCTYPE_RE = /^\s*(?:<!--(?:(?!-->)[\s\S])*-->\s*)*<!doctype\s+html\s*>/i;
+// Sticky: the linter's scanner matches tags only at the '<' it is positioned on.
+const TAG_RE = /<\s*(\/?)\s*([a-zA-Z][a-zA-Z0-9\-]*)[^>]*>/y;
+// One pass counts structural open tags (group 1) and script/style end tags
+// (group 2); a bare '<!--' match marks a comment for the loop to skip.
+const TAG_COUNT_RE = /<!--|<\s*(html|head|body|script|style)\b|<\/\s*(script|style)\s*>/gi;
+// Comments and script/style bodies (raw text, up to the first matching end
+// tag) are jumped over by the scanner, keyed by the opener's captured kind.
+const RAW_SKIP_OPEN_RE = /<(!--|script\b|style\b)/iy;
+const RAW_SKIP_END_RE: Record<string, RegExp> = {
+  '!--': /-->/g,
+  script: /<\/script\s*>/gi,
+  style: /<\/style\s*>/gi,
+};
+
+const QUOTED_VALUE_RE = /["']([^"']+)["']/;
+
+const COMMAND_RE = /\[\[\s*([A-Z_]+)(?::\s*(.+?))?\s*\]\]/gim;
+const HTML_DOC_RE = /<!doctype\s+html[^>]*>[\s\S]*?<\/html\s*>/i;
+const STATUS_UPDATE_RE = /What was updated in code\?\s*\([^)]*\)\s*\n([\s\S]*?)\s*\{STATUS:\s*([^}]+)\}/i;
+// Checked against the tail of a streaming reply only.
+const HTML_END_RE = /<\/html\s*>/i;
+
+// QA probes fused into one alternation that analyzeGeneralIssues runs once over
+// the lowercased document, so the patterns are lowercase and need no i flag.
+// Plain literals (audio data URI, <canvas>) are substring checks.
+const QG_PROBES: Array<[string, RegExp]> = [
+  ['viewport', /meta\s+name=['"]viewport['"]/],
+  ['touch', /addeventlistener\(\s*['"](?:touchstart|touchmove|touchend|pointerdown|pointermove|pointerup)['"]/],
+  ['keyboard', /\b(?:wasd|arrow keys|arrow(?:left|right|up|down)|key[wasd])\b/],
+  ['gameId', /id\s*=\s*['"]game['"]/],
+  ['buttonId', /id\s*=\s*["'](?:restart|start|pause|menu)["']/],
+  ['collision', /collision|intersect|hittest/],
+  ['scriptOpen', /<\s*script\b/],
+  ['scriptClose', /<\/\s*script\s*>/],
+];
+const QG_SCAN_RE = new RegExp(QG_PROBES.map(([name, re]) => `(?<${name}>${re.source})`).join('|'), 'g');
+// Case-sensitive call site, tested once against the original document.
+const RAF_CALL_RE = /requestAnimationFrame\s*\(/;
+
+const BUTTON_HANDLER_RE: Record<string, RegExp> = Object.fromEntries(
+  ['restart', 'start', 'pause', 'menu'].map(id => [
+    id,
+    new RegExp(`getelementbyid\\(\\s*['"]${id}['"]\\s*\\)\\.addeventlistener`),
+  ])
+);
+
+// OpenAI chat completions endpoint. Every agent call goes through
+// postChatCompletion so requests share one origin and the native HTTP
+// stack keeps the pooled keep-alive connection between rounds.
+const OPENAI_CHAT_URL = 'https://api.openai.com/v1/chat/completions';
+
+let openAIHeaders: { apiKey: string; headers: Record<string, string> } | null = null;
+
+const getOpenAIHeaders = (apiKey: string): Record<string, string> => {
+  if (!openAIHeaders || openAIHeaders.apiKey !== apiKey) {
+    openAIHeaders = {
+      apiKey,
+      headers: {
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${apiKey}`,
+      },
+    };
+  }
+  return openAIHeaders.headers;
+};
+
+// Error bodies only feed exception messages, so keep just their head. The body
+// is still read and decoded in full; only the message text is truncated.
+const ERROR_TEXT_LIMIT = 500;
+
+const truncatedErrorText = async (response: Response): Promise<string> => {
+  return (await response.text()).slice(0, ERROR_TEXT_LIMIT);
+};
+
+const postChatCompletion = (apiKey: string, payload: Record<string, any>): Promise<Response> => {
+  return fetch(OPENAI_CHAT_URL, {
+    method: 'POST',
+    headers: getOpenAIHeaders(apiKey),
+    body: JSON.stringify(payload),
+  });
+};
+
+// Streams a chat completion over SSE and resolves with the accumulated reply.
+// body must be the serialized payload with stream enabled. onText sees the
+// reply so far after each delta. Resolves with null when the stream failed
+// before any reply text arrived and the API did not reject the request (4xx),
+// so the caller can safely retry without streaming.
+const streamChatCompletion = (
+  apiKey: string,
+  body: string,
+  onText?: (text: string, delta: string) => void
+): Promise<{ content: string; usage?: any } | null> => {
+  return new Promise((resolve, reject) => {
+    const es = new EventSource(OPENAI_CHAT_URL, {
+      method: 'POST',
+      headers: getOpenAIHeaders(apiKey),
+      body,
+      pollingInterval: 0,
+      timeoutBeforeConnection: 0,
+    });
+    let content = '';
+    let usage: any;
+    let settled = false;
+
+    const settle = (): boolean => {
+      if (settled) return false;
+      settled = true;
+      es.removeAllEventListeners();
+      es.close();
+      return true;
+    };
+
+    es.addEventListener('message', (event: any) => {
+      if (!event.data) return;
+      if (event.data === '[DONE]') {
+        if (settle()) resolve({ content, usage });
+        return;
+      }
+      try {
+        const chunk = JSON.parse(event.data);
+        if (chunk.usage) {
+          usage = chunk.usage;
+        }
+        const delta = chunk.choices?.[0]?.delta?.content || '';
+        if (delta) {
+          content += delta;
+          onText?.(content, delta);
+        }
+      } catch (e) {
+        if (settle()) reject(e instanceof Error ? e : new Error(String(e)));
+      }
+    });
+    es.addEventListener('error', (event: any) => {
+      if (!settle()) return;
+      const status: number | undefined = event.xhrStatus;
+      if (!content && !(status && status >= 400 && status < 500)) {
+        resolve(null);
+        return;
+      }
+      reject(new Error(`OpenAI API error: HTTP ${status ?? 'n/a'} - ${String(event.message || event.type).slice(0, ERROR_TEXT_LIMIT)}`));
+    });
+    es.addEventListener('close', () => {
+      if (settle()) resolve({ content, usage });
+    });
+  });
+};
+
+// Once the controller history grows past this many messages, rounds older than
+// the one holding the latest HTML are condensed into a single summary message.
+const MAX_HISTORY_MESSAGES = 8;
+
 // Protocol Commands
 type ProtocolCommand = 'DO:LINT' | 'DO:QG_CHECK' | 'TOSELF' | 'ASK:FINAL_OK?' | 'FINAL';
 
@@ -95,8 +255,30 @@ interface GeneralIssue {
   severity: 'error' | 'warn';
 }
 
+// Lint and QA results keyed by the exact HTML text. The controller re-checks
+// the same document several times per round, so a few entries are enough.
+const CHECK_CACHE_SIZE = 8;
+const lintCache = new Map<string, LintError[]>();
+const qgCache = new Map<string, GeneralIssue[]>();
+
+const cachedByText = <T,>(cache: Map<string, T>, text: string, compute: (text: string) => T): T => {
+  const hit = cache.get(text);
+  if (hit !== undefined) {
+    cache.delete(text);
+    cache.set(text, hit);
+    return hit;
+  }
+  const result = compute(text);
+  cache.set(text, result);
+  if (cache.size > CHECK_CACHE_SIZE) {
+    cache.delete(cache.keys().next().value);
+  }
+  return result;
+};
+
 interface TokenUsage {
   prompt_tokens: number;
+  cached_prompt_tokens: number;
   completion_tokens: number;
   total_tokens: number;
 }
@@ -223,6 +405,7 @@ export default function GameCreator({ onGamePublished }: GameCreatorProps = {})
   // Token tracking
   const [cumulativeTokens, setCumulativeTokens] = useState<TokenUsage>({
     prompt_tokens: 0,
+    cached_prompt_tokens: 0,
     completion_tokens: 0,
     total_tokens: 0,
   });
@@ -577,88 +760,130 @@ export default function GameCreator({ onGamePublished }: GameCreatorProps = {})
 
   // Utilities
   const stripCodeFences = (text: string): string => {
-    return text.replace(/^\s*```[a-zA-Z]*\s*|\s*```\s*$/gm, '');
+    // Documents from extractHtmlDoc are already fence-free; skip the regex pass for them.
+    return text.includes('```') ? text.replace(CODE_FENCE_RE, '') : text;
   };
 
-  const stripComments = (html: string): string => {
-    return html.replace(/<!--[\s\S]*?-->/g, '');
-  };
-
-  const removeBlocks = (html: string, tag: string): string => {
-    const regex = new RegExp(`<${tag}\\b[\\s\\S]*?</${tag}\\s*>`, 'gi');
-    return html.replace(regex, '');
-  };
-
-  const buildLineIndex = (text: string) => {
-    const lines = text.split('\n');
-    const starts: number[] = [];
-    let pos = 0;
-    for (const ln of lines) {
-      starts.push(pos);
-      pos += ln.length + 1;
-    }
-    return { lines, starts };
-  };
-
-  const posToLineCol = (pos: number, starts: number[]): [number, number] => {
-    let line = 0;
-    for (let i = 0; i < starts.length; i++) {
-      if (starts[i] <= pos) {
-        line = i;
-      } else {
-        break;
+  // Maps character offsets in text to a 1-based line number and trimmed line
+  // text. The linter asks for offsets in increasing order, so newlines are only
+  // counted between the previous offset and the next one; an earlier offset
+  // restarts from the top.
+  const lineLocator = (text: string) => {
+    let lastPos = 0;
+    let line = 1;
+    let lineStart = 0;
+    let lineEnd = -1;
+    let snippet: string | null = null;
+    return (pos: number): [number, string] => {
+      if (lineEnd === -1 || pos < lastPos) {
+        line = 1;
+        lineStart = 0;
+        lineEnd = text.indexOf('\n');
+        if (lineEnd === -1) lineEnd = text.length;
+        snippet = null;
       }
-    }
-    const col = pos - starts[line] + 1;
-    return [line, col];
+      while (lineEnd < pos) {
+        line++;
+        lineStart = lineEnd + 1;
+        lineEnd = text.indexOf('\n', lineStart);
+        if (lineEnd === -1) lineEnd = text.length;
+        snippet = null;
+      }
+      lastPos = pos;
+      if (snippet === null) {
+        snippet = text.slice(lineStart, lineEnd).trim();
+      }
+      return [line, snippet];
+    };
   };
 
   // HTML Linting
-  const lintHtml = (html: string): LintError[] => {
+  const runLint = (html: string): LintError[] => {
     const errors: LintError[] = [];
     
-    html = html.replace(/^\s*```[a-zA-Z]*\s*|\s*```\s*$/gm, '');
-    const checkHtml = stripComments(html);
-    const scrubbed = removeBlocks(removeBlocks(checkHtml, 'script'), 'style');
-    const { lines, starts } = buildLineIndex(checkHtml);
+    html = stripCodeFences(html);
+    const lineAt = lineLocator(html);
 
-    if (!/^\s*<!doctype\s+html\s*>/i.test(checkHtml)) {
-      const snippet = lines[0]?.trim() || '';
+    if (!DOCTYPE_RE.test(html)) {
+      const [, snippet] = lineAt(0);
       errors.push({ message: 'Missing <!DOCTYPE html> at top', line: 1, snippet });
     }
 
+    const opens: Record<string, number> = { html: 0, head: 0, body: 0, script: 0, style: 0 };
+    const closes: Record<string, number> = { script: 0, style: 0 };
+    // End offset of the comment or raw-text span whose body starts at from, or -1
+    // when it is never closed. A failed search means no terminator exists past
+    // that offset, so later openers of the same kind skip the search.
+    const unterminatedFrom: Record<string, number> = {};
+    const skipEnd = (kind: string, from: number): number => {
+      if (from >= (unterminatedFrom[kind] ?? Infinity)) return -1;
+      const endRe = RAW_SKIP_END_RE[kind];
+      endRe.lastIndex = from;
+      const end = endRe.exec(html);
+      if (!end) {
+        unterminatedFrom[kind] = from;
+        return -1;
+      }
+      return end.index + end[0].length;
+    };
+
+    TAG_COUNT_RE.lastIndex = 0;
+    let counted;
+    while ((counted = TAG_COUNT_RE.exec(html)) !== null) {
+      if (counted[1]) {
+        opens[counted[1].toLowerCase()]++;
+      } else if (counted[2]) {
+        closes[counted[2].toLowerCase()]++;
+      } else {
+        // An unclosed '<!--' is not a comment; scanning just continues past it.
+        const end = skipEnd('!--', TAG_COUNT_RE.lastIndex);
+        if (end !== -1) TAG_COUNT_RE.lastIndex = end;
+      }
+    }
+
     for (const tag of ['html', 'head', 'body']) {
-      const regex = new RegExp(`<\\s*${tag}\\b`, 'gi');
-      const matches = checkHtml.match(regex) || [];
-      if (matches.length === 0) {
+      const count = opens[tag];
+      if (count === 0) {
         errors.push({ message: `Missing <${tag}> tag`, line: 1, snippet: '' });
-      } else if (matches.length > 1) {
-        errors.push({ message: `Multiple <${tag}> tags found (${matches.length})`, line: 1, snippet: '' });
+      } else if (count > 1) {
+        errors.push({ message: `Multiple <${tag}> tags found (${count})`, line: 1, snippet: '' });
       }
     }
 
     for (const tag of ['script', 'style']) {
-      const openRegex = new RegExp(`<\\s*${tag}\\b`, 'gi');
-      const closeRegex = new RegExp(`</\\s*${tag}\\s*>`, 'gi');
-      const opens = (checkHtml.match(openRegex) || []).length;
-      const closes = (checkHtml.match(closeRegex) || []).length;
-      if (opens !== closes) {
+      if (opens[tag] !== closes[tag]) {
         errors.push({
-          message: `Unbalanced <${tag}> tags (open=${opens}, close=${closes})`,
+          message: `Unbalanced <${tag}> tags (open=${opens[tag]}, close=${closes[tag]})`,
           line: 1,
           snippet: ''
         });
       }
     }
 
-    const tagRegex = /<\s*(\/)??\s*([a-zA-Z][a-zA-Z0-9\-]*)\b[^>]*?>/g;
+    // Single forward pass over the document: comments and script/style bodies
+    // are skipped in place rather than cut out of a copy first, so reported
+    // line numbers match the document as written.
     const stack: Array<[string, number]> = [];
-    let match;
 
-    while ((match = tagRegex.exec(scrubbed)) !== null) {
+    for (let cursor = html.indexOf('<'); cursor !== -1; cursor = html.indexOf('<', cursor + 1)) {
+      RAW_SKIP_OPEN_RE.lastIndex = cursor;
+      const opener = RAW_SKIP_OPEN_RE.exec(html);
+      if (opener) {
+        const end = skipEnd(opener[1].toLowerCase(), cursor + opener[0].length);
+        if (end !== -1) {
+          cursor = end - 1;
+          continue;
+        }
+      }
+
+      TAG_RE.lastIndex = cursor;
+      const match = TAG_RE.exec(html);
+      if (!match) continue;
+
       const isClosing = !!match[1];
       const tagName = match[2].toLowerCase();
-      const pos = match.index;
+      const pos = cursor;
+      cursor += match[0].length - 1;
 
       if (tagName === '!doctype') continue;
 
@@ -670,30 +895,27 @@ export default function GameCreator({ onGamePublished }: GameCreatorProps = {})
         }
       } else {
         if (VOID_TAGS.has(tagName)) {
-          const [line] = posToLineCol(pos, starts);
-          const snippet = lines[line]?.trim() || '';
+          const [line, snippet] = lineAt(pos);
           errors.push({
             message: `Unexpected closing tag </${tagName}> for void element`,
-            line: line + 1,
+            line,
             snippet
           });
           continue;
         }
         
         if (stack.length === 0) {
-          const [line] = posToLineCol(pos, starts);
-          const snippet = lines[line]?.trim() || '';
-          errors.push({ message: `Unmatched closing tag </${tagName}>`, line: line + 1, snippet });
+          const [line, snippet] = lineAt(pos);
+          errors.push({ message: `Unmatched closing tag </${tagName}>`, line, snippet });
           continue;
         }
         
         const [openTag] = stack[stack.length - 1];
         if (openTag !== tagName) {
-          const [line] = posToLineCol(pos, starts);
-          const snippet = lines[line]?.trim() || '';
+          const [line, snippet] = lineAt(pos);
           errors.push({
             message: `Mismatched closing tag </${tagName}>; expected </${openTag}>`,
-            line: line + 1,
+            line,
             snippet
           });
           stack.pop();
@@ -704,14 +926,15 @@ export default function GameCreator({ onGamePublished }: GameCreatorProps = {})
     }
 
     for (const [openTag, openPos] of stack) {
-      const [line] = posToLineCol(openPos, starts);
-      const snippet = lines[line]?.trim() || '';
-      errors.push({ message: `Unclosed <${openTag}> tag`, line: line + 1, snippet });
+      const [line, snippet] = lineAt(openPos);
+      errors.push({ message: `Unclosed <${openTag}> tag`, line, snippet });
     }
 
     return errors;
   };
 
+  const lintHtml = (html: string): LintError[] => cachedByText(lintCache, html, runLint);
+
   const formatErrorsForPrompt = (errors: LintError[], maxItems = 12): string => {
     const out: string[] = [];
     for (let i = 0; i < Math.min(errors.length, maxItems); i++) {
@@ -729,60 +952,86 @@ export default function GameCreator({ onGamePublished }: GameCreatorProps = {})
   };
 
   // General Issue Analyzer
-  const analyzeGeneralIssues = (html: string): GeneralIssue[] => {
+  const runQGChecks = (html: string): GeneralIssue[] => {
     const issues: GeneralIssue[] = [];
 
     const addIssue = (name: string, detail: string, hint: string, severity: 'error' | 'warn' = 'warn') => {
       issues.push({ name, detail, hint, severity });
     };
 
-    if (!/meta\s+name=['"]viewport['"]/i.test(html)) {
+    const htmlLower = html.toLowerCase();
+    // toLowerCase only changes length for a few non-ASCII letters; when it
+    // doesn't, match offsets in htmlLower line up with html.
+    const aligned = htmlLower.length === html.length;
+    const hasCanvas = html.includes('<canvas');
+    const seen = new Set<string>();
+    const buttonIds: string[] = [];
+    let scriptOpens = 0;
+    let scriptCloses = 0;
+    let match;
+
+    QG_SCAN_RE.lastIndex = 0;
+    while ((match = QG_SCAN_RE.exec(htmlLower)) !== null) {
+      const groups = match.groups || {};
+      const probe = QG_PROBES.find(([name]) => groups[name] !== undefined);
+      if (!probe) continue;
+      const [name] = probe;
+
+      seen.add(name);
+      if (name === 'buttonId') {
+        buttonIds.push(aligned ? html.slice(match.index, match.index + match[0].length) : match[0]);
+      } else if (name === 'scriptOpen') {
+        scriptOpens++;
+      } else if (name === 'scriptClose') {
+        scriptCloses++;
+      }
+    }
+
+    if (!seen.has('viewport')) {
       addIssue('viewport_meta_missing',
         'No viewport meta for mobile.',
         'Add: <meta name="viewport" content="width=device-width,initial-scale=1,viewport-fit=cover,user-scalable=no">',
         'error');
     }
 
-    const hasTouch = /addEventListener\(\s*['"](?:touchstart|touchmove|touchend|pointerdown|pointermove|pointerup)['"]/.test(html);
-    if (!hasTouch) {
+    if (!seen.has('touch')) {
       addIssue('touch_controls_missing',
         'No touch or pointer event handlers detected.',
         'Add touch/pointer event handlers or on-screen controls for mobile.',
         'error');
     }
 
-    if (/\b(?:WASD|arrow keys|Arrow(?:Left|Right|Up|Down)|Key[WASD])\b/i.test(html)) {
+    if (seen.has('keyboard')) {
       addIssue('keyboard_instructions_present',
         'UI or code references keyboard controls.',
         'Update UI text to reflect touch controls, map keyboard to touch as fallback.',
         'warn');
     }
 
-    if (!/requestAnimationFrame\s*\(/.test(html)) {
+    if (!RAF_CALL_RE.test(html)) {
       addIssue('no_game_loop',
         'No requestAnimationFrame game loop detected.',
         'Ensure there is a main loop to update and render the game each frame.',
         'warn');
     }
 
-    if (/data:audio\/wav;base64/i.test(html)) {
+    if (htmlLower.includes('data:audio/wav;base64')) {
       addIssue('embedded_audio_data_uri',
         'Large base64 audio embedded can fail to load and bloat file.',
         'Prefer small SFX or remove embedded audio for MVP.',
         'warn');
     }
 
-    if (!/<canvas\b/.test(html) && !/id\s*=\s*['"]game['"]/.test(html)) {
+    if (!hasCanvas && !seen.has('gameId')) {
       addIssue('no_game_surface',
         'No obvious game surface like <canvas> or #game container found.',
         'Add a canvas or a game container element.',
         'warn');
     }
 
-    const buttonIds = html.match(/id\s*=\s*["'](restart|start|pause|menu)["']/gi) || [];
-    buttonIds.forEach(match => {
-      const id = (match as string).match(/["']([^"']+)["']/)?.[1];
-      if (id && !new RegExp(`getElementById\\(\\s*['"]${id}['"]\\s*\\)\\.addEventListener`).test(html)) {
+    buttonIds.forEach(buttonMatch => {
+      const id = buttonMatch.match(QUOTED_VALUE_RE)?.[1];
+      if (id && !BUTTON_HANDLER_RE[id.toLowerCase()].test(htmlLower)) {
         addIssue('button_no_handler',
           `Button #${id} lacks event listener.`,
           `Add: document.getElementById('${id}').addEventListener('click', ...)`,
@@ -790,15 +1039,13 @@ export default function GameCreator({ onGamePublished }: GameCreatorProps = {})
       }
     });
 
-    if (!/collision|intersect|hitTest/i.test(html) && /<canvas\b/.test(html)) {
+    if (!seen.has('collision') && hasCanvas) {
       addIssue('no_collision_logic',
         'No explicit collision or boundary checks detected.',
         'Add simple boundary or collision checks appropriate to the game.',
         'warn');
     }
 
-    const scriptOpens = (html.match(/<\s*script\b/gi) || []).length;
-    const scriptCloses = (html.match(/<\/\s*script\s*>/gi) || []).length;
     if (scriptOpens !== scriptCloses) {
       addIssue('unbalanced_script_tags',
         `Script tags open=${scriptOpens} close=${scriptCloses}.`,
@@ -809,6 +1056,17 @@ export default function GameCreator({ onGamePublished }: GameCreatorProps = {})
     return issues;
   };
 
+  const analyzeGeneralIssues = (html: string): GeneralIssue[] => cachedByText(qgCache, html, runQGChecks);
+
+  // Fills the check caches for html on a later tick, outside the caller's event
+  // handler, e.g. while the rest of a streamed reply is still arriving.
+  const warmHtmlChecks = (html: string): void => {
+    setTimeout(() => {
+      lintHtml(html);
+      analyzeGeneralIssues(html);
+    }, 0);
+  };
+
   const formatQGFeedback = (issues: GeneralIssue[]): string => {
     if (!issues.length) {
       return 'QG_CHECK: OK\nNo general issues detected.';
@@ -823,9 +1081,10 @@ export default function GameCreator({ onGamePublished }: GameCreatorProps = {})
   // Protocol parsing
   const parseCommands = (text: string): Array<[string, string]> => {
     const commands: Array<[string, string]> = [];
-    const pattern = /\[\[\s*([A-Z_]+)(?::\s*(.+?))?\s*\]\]/gim;
+    if (!text.includes('[[')) return commands;
     let match;
-    while ((match = pattern.exec(text)) !== null) {
+    COMMAND_RE.lastIndex = 0;
+    while ((match = COMMAND_RE.exec(text)) !== null) {
       const cmd = match[1].toUpperCase().trim();
       const arg = (match[2] || '').trim();
       commands.push([cmd, arg]);
@@ -835,12 +1094,12 @@ export default function GameCreator({ onGamePublished }: GameCreatorProps = {})
 
   const extractHtmlDoc = (text: string): string | null => {
     text = stripCodeFences(text);
-    const match = text.match(/<!doctype\s+html[^>]*>[\s\S]*?<\/html\s*>/i);
+    const match = text.match(HTML_DOC_RE);
     return match ? match[0] : null;
   };
 
   const extractStatusUpdate = (text: string): string | null => {
-    const match = text.match(/What was updated in code\?\s*\([^)]*\)\s*\n([\s\S]*?)\s*\{STATUS:\s*([^}]+)\}/i);
+    const match = text.match(STATUS_UPDATE_RE);
     return match ? match[1].trim() : null;
   };
 
@@ -925,8 +1184,12 @@ Deliverable:
 
   // Token usage update utility
   const updateTokenUsage = (usage: any) => {
+    // OpenAI reuses prompt prefixes of 1024+ tokens; this shows how much of each prompt hit that cache.
+    const cachedTokens = usage.prompt_tokens_details?.cached_tokens || 0;
+    console.log(`Prompt cache: ${cachedTokens}/${usage.prompt_tokens || 0} prompt tokens cached`);
     setCumulativeTokens((prev: TokenUsage) => ({
       prompt_tokens: prev.prompt_tokens + (usage.prompt_tokens || 0),
+      cached_prompt_tokens: prev.cached_prompt_tokens + cachedTokens,
       completion_tokens: prev.completion_tokens + (usage.completion_tokens || 0),
       total_tokens: prev.total_tokens + (usage.total_tokens || 0),
     }));
@@ -999,32 +1262,25 @@ Please edit the HTML code above according to the user request and output the com
     console.log('System Prompt:', systemPrompt.substring(0, 200) + '...');
     console.log('HTML Lines:', currentHtml.split('\n').length);
 
-    const response = await fetch('https://api.openai.com/v1/chat/completions', {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'Authorization': `Bearer ${apiKey}`,
-      },
-      body: JSON.stringify({
-        model: config.model_name || "gpt-5-mini",
-        messages: [
-          {
-            role: "system",
-            content: systemPrompt
-          },
-          {
-            role: "user", 
-            content: userPrompt
-          }
-        ],
-        response_format: { type: "text" },
-        verbosity: config.verbosity || "low",
-        reasoning_effort: config.reasoning_effort || "low"
-      }),
+    const response = await postChatCompletion(apiKey, {
+      model: config.model_name || "gpt-5-mini",
+      messages: [
+        {
+          role: "system",
+          content: systemPrompt
+        },
+        {
+          role: "user", 
+          content: userPrompt
+        }
+      ],
+      response_format: { type: "text" },
+      verbosity: config.verbosity || "low",
+      reasoning_effort: config.reasoning_effort || "low"
     });
 
     if (!response.ok) {
-      const errorText = await response.text();
+      const errorText = await truncatedErrorText(response);
       throw new Error(`Edit API error: HTTP ${response.status} - ${errorText}`);
     }
 
@@ -1043,7 +1299,12 @@ Please edit the HTML code above according to the user request and output the com
   const callOpenAI = async (
     systemMsg: string,
     messages: Array<{role: string, content: string}>,
-    options?: { model?: string; reasoning_effort?: string }
+    options?: {
+      model?: string;
+      reasoning_effort?: string;
+      prompt_cache_key?: string;
+      onStream?: (text: string, delta: string) => void;
+    }
   ): Promise<{content: string, usage?: any}> => {
     const appConfigService = AppConfigService.getInstance();
     const config = await appConfigService.getConfig();
@@ -1059,6 +1320,10 @@ Please edit the HTML code above according to the user request and output the com
       throw new Error("Missing OpenAI API key");
     }
 
+    const model = options?.model || config.model_name || "gpt-5-mini";
+    const verbosity = config.verbosity || "low";
+    const reasoningEffort = options?.reasoning_effort || config.reasoning_effort || "low";
+
     const formattedMessages = [
       {
         role: "developer",
@@ -1070,36 +1335,43 @@ Please edit the HTML code above according to the user request and output the com
       }))
     ];
 
-    const response = await fetch('https://api.openai.com/v1/chat/completions', {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'Authorization': `Bearer ${apiKey}`,
-      },
-      body: JSON.stringify({
-        model: options?.model || config.model_name || "gpt-5-mini",
-        messages: formattedMessages,
-        response_format: { type: "text" },
-        verbosity: config.verbosity || "low",
-        reasoning_effort: options?.reasoning_effort || config.reasoning_effort || "low"
-      }),
-    });
+    const payload = {
+      model,
+      messages: formattedMessages,
+      response_format: { type: "text" },
+      verbosity,
+      reasoning_effort: reasoningEffort,
+      ...(options?.prompt_cache_key ? { prompt_cache_key: options.prompt_cache_key } : {})
+    };
 
-    if (!response.ok) {
-      const errorText = await response.text();
-      throw new Error(`OpenAI API error: HTTP ${response.status} - ${errorText}`);
+    let result: { content: string; usage?: any } | null = null;
+    if (options?.onStream) {
+      const body = JSON.stringify({ ...payload, stream: true, stream_options: { include_usage: true } });
+      result = await streamChatCompletion(apiKey, body, options.onStream);
+      if (!result) {
+        console.warn('Streaming request failed before any reply arrived, retrying without streaming.');
+      }
     }
+    if (!result) {
+      const response = await postChatCompletion(apiKey, payload);
 
-    const data = await response.json();
+      if (!response.ok) {
+        const errorText = await truncatedErrorText(response);
+        throw new Error(`OpenAI API error: HTTP ${response.status} - ${errorText}`);
+      }
+
+      const data = await response.json();
+      result = {
+        content: data.choices?.[0]?.message?.content || "",
+        usage: data.usage
+      };
+    }
 
-    if (data.usage) {
-      updateTokenUsage(data.usage);
+    if (result.usage) {
+      updateTokenUsage(result.usage);
     }
 
-    return {
-      content: data.choices?.[0]?.message?.content || "",
-      usage: data.usage
-    };
+    return result;
   };
 
 
@@ -1182,32 +1454,25 @@ ${htmlCode.substring(0, 15000)}${htmlCode.length > 15000 ? '\n... (code truncate
 
 Respond with ONLY the JSON object as specified in the system prompt.`;
 
-    const response = await fetch('https://api.openai.com/v1/chat/completions', {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'Authorization': `Bearer ${apiKey}`,
-      },
-      body: JSON.stringify({
-        model: config.model_name || "gpt-5-mini",
-        messages: [
-          {
-            role: "developer",
-            content: [{ type: "text", text: systemPrompt }]
-          },
-          {
-            role: "user",
-            content: [{ type: "text", text: userPrompt }]
-          }
-        ],
-        response_format: { type: "json_object" },
-        verbosity: config.verbosity || "low",
-        reasoning_effort: config.reasoning_effort || "low"
-      }),
+    const response = await postChatCompletion(apiKey, {
+      model: config.model_name || "gpt-5-mini",
+      messages: [
+        {
+          role: "developer",
+          content: [{ type: "text", text: systemPrompt }]
+        },
+        {
+          role: "user",
+          content: [{ type: "text", text: userPrompt }]
+        }
+      ],
+      response_format: { type: "json_object" },
+      verbosity: config.verbosity || "low",
+      reasoning_effort: config.reasoning_effort || "low"
     });
 
     if (!response.ok) {
-      const errorText = await response.text();
+      const errorText = await truncatedErrorText(response);
       throw new Error(`Problem Finder API error: HTTP ${response.status} - ${errorText}`);
     }
 
@@ -1350,8 +1615,16 @@ Identify the exact line numbers with issues and provide your analysis in JSON fo
 
   // Controller loop with Problem Finder integration
   const controllerLoop = async (userTopic: string, maxRounds = 5): Promise<string> => {
+    // The developer prompt and the first user message (game plan) stay byte-identical
+    // across rounds, so OpenAI can serve them from its prompt cache. Rounds otherwise
+    // append, but once the history is condensed, messages[1] is rewritten whenever a
+    // newer round produces HTML. The reusable cached prefix is then only the prompt
+    // and the plan: condensing trades cache hits on older rounds for a shorter request.
     const systemPrompt = buildSystemPrompt();
     const messages: Array<{role: string, content: string}> = [];
+    // Routes this run's round requests to one prompt-cache key. Runs diverge right
+    // after the system prompt, so each run gets its own key rather than sharing one.
+    const promptCacheKey = `uniagent_${Date.now()}_${Math.random().toString(36).slice(2, 11)}`;
 
     setAgentMessage('Analyzing your game idea...');
     let checklistItems: string[] = []; // NEW: hold extracted checklist for round slicing
@@ -1468,49 +1741,12 @@ Output one complete HTML5 file. Then request checks with [[DO:LINT]] and [[DO:QG
     let latestHtml: string | null = null;
     let lastLint: LintError[] = [];
     let lastQG: GeneralIssue[] = [];
-
-    try {
-      const { content: detailedInstructions } = await callOpenAI(preRoundSystemMsg, preRoundMessages);
-      console.log('Detailed instructions generated:', detailedInstructions.slice(0, 400) + '...');
-
-      setGamePlan(detailedInstructions);
-      // Extract checklist items for overlay display
-      const extracted = extractChecklistItems(detailedInstructions);
-      checklistItems = extracted;
-      setExtractedChecklist(extracted);
-      setCheckedItems(new Array(extracted.length).fill(false)); // Initialize all as unchecked
-      progressAnim.setValue(0);
-
-      // Prepare ROUND 1: only first two checklist items
-      const round1Items = extracted.slice(0, 2);
-      const round1List = round1Items.map((it, i) => `${i + 1}) ${it}`).join('\n');
-
-      const initUser = `ROUND 1 — Implement ONLY these two checklist items:
-${round1List}
-
-GAME PLAN (for context only, do not implement beyond the two items above):
-${detailedInstructions}
-
-Output one complete HTML file. After the HTML, request checks with [[DO:LINT]] and [[DO:QG_CHECK]], and add one [[TOSELF: ...]] instruction for next turn.`;
-
-      messages.push({ role: 'user', content: initUser });
-
-      // Decide total planned rounds = pairs of checklist items (at least 1)
-      const totalRoundPairs = Math.max(1, Math.ceil(extracted.length / 2));
-      plannedRounds = Math.max(maxRounds, totalRoundPairs);
-
-    } catch (error) {
-      console.warn('Pre-round failed, using basic input:', error);
-      // Fallback: still enforce round-limited approach with no extracted checklist
-      const initUser = `User request: Build a tiny playable mini-game from this idea:
-${userTopic}
-
-ROUND 1 — Implement ONLY the minimal scene setup and one core interaction you infer from the idea (2 micro-items max). Do NOT implement additional features.
-
-Output one complete HTML5 file. Then request checks with [[DO:LINT]] and [[DO:QG_CHECK]], and add one [[TOSELF: ...]] instruction to improve next turn.`;
-
-      messages.push({ role: 'user', content: initUser });
-    }
+    // Per-round check outcomes (null when the round ran no check on its document) and the
+    // messages index where the latest HTML's round starts, used to condense older rounds
+    // out of the history.
+    const roundNotes: Array<{ lint: number | null; qgErrors: number | null; selfInstruction: string }> = [];
+    let htmlRound = 1;
+    let htmlRoundStart = 0;
 
     for (let roundIdx = 1; roundIdx <= plannedRounds; roundIdx++) {
       setCurrentRound(roundIdx);
@@ -1574,6 +1810,7 @@ Output one complete HTML5 file. Then request checks with [[DO:LINT]] and [[DO:QG
       }
 
       // Push the current round's instruction (except round 1 which was already pushed)
+      const roundStart = roundIdx === 1 ? 0 : messages.length;
       const pairStart = (roundIdx - 1) * 2;
       const currentPair = checklistItems.slice(pairStart, pairStart + 2);
       if (roundIdx > 1) {
@@ -1604,10 +1841,24 @@ Output one complete HTML file. After the HTML, request checks with [[DO:LINT]] a
       setAgentMessage(`Round ${roundIdx}: Generating response...`);
 
       console.log(`\n=== ROUND ${roundIdx} ===`);
-      const { content: response, usage } = await callOpenAI(
-        systemPrompt,
-        messages
-      );
+      // Stream the reply: once the document's </html> arrives, check it while the
+      // status and commands are still generating. The stream always runs to the
+      // end so the final usage chunk is counted.
+      let streamedHtmlEnd = false;
+      const onStream = (text: string, delta: string): void => {
+        const tail = text.slice(-(delta.length + 16));
+        if (!streamedHtmlEnd && HTML_END_RE.test(tail)) {
+          streamedHtmlEnd = true;
+          const streamedDoc = extractHtmlDoc(text);
+          if (streamedDoc) {
+            warmHtmlChecks(streamedDoc);
+          }
+        }
+      };
+      const { content: response, usage } = await callOpenAI(systemPrompt, messages, {
+        prompt_cache_key: promptCacheKey,
+        onStream
+      });
       const responseText = stripCodeFences(response || '');
       console.log('\nAGENT OUTPUT (truncated):\n' + responseText.slice(0, 600) + (responseText.length > 600 ? '\n...' : ''));
 
@@ -1615,9 +1866,14 @@ Output one complete HTML file. After the HTML, request checks with [[DO:LINT]] a
       const tokensUsedThisRound = usage?.total_tokens || 0;
 
       const followups: Array<{role: string, content: string}> = [];
+      let selfInstruction = '';
+      let roundLinted = false;
+      let roundQGChecked = false;
 
       const htmlDoc = extractHtmlDoc(responseText);
       if (htmlDoc) {
+        htmlRound = roundIdx;
+        htmlRoundStart = roundStart;
         latestHtml = htmlDoc;
         setGameHtml(htmlDoc);
       }
@@ -1658,8 +1914,9 @@ Output one complete HTML file. After the HTML, request checks with [[DO:LINT]] a
             followups.push({ role: 'user', content: '[[RESULT:LINT]]\nNo full HTML detected to lint.' });
             lastLint = [{ message: 'No HTML to lint', line: 1, snippet: '' }];
           } else {
-            const lintErrors = lintHtml(latestHtml || '');
+            const lintErrors = lintHtml(latestHtml);
             lastLint = lintErrors;
+            roundLinted = true;
             const lintFeedback = lintErrors.length ?
               'LINTER: Found issues:\n' + formatErrorsForPrompt(lintErrors) :
               'LINTER: OK. No syntax issues.';
@@ -1677,12 +1934,14 @@ Output one complete HTML file. After the HTML, request checks with [[DO:LINT]] a
             lastQG = qg;
             followups.push({ role: 'user', content: `[[RESULT:QG_CHECK]]\n${formatQGFeedback(qg)}` });
           } else {
-            const qg = analyzeGeneralIssues(latestHtml || '');
+            const qg = analyzeGeneralIssues(latestHtml);
             lastQG = qg;
+            roundQGChecked = true;
             followups.push({ role: 'user', content: `[[RESULT:QG_CHECK]]\n${formatQGFeedback(qg)}` });
           }
         } else if (cmd === 'TOSELF') {
           setAgentMessage('Self-instruction...');
+          selfInstruction = arg;
           followups.push({ role: 'user', content: `[[SELF-INSTRUCTION]] ${arg}` });
         } else if (cmd === 'ASK' && arg.toUpperCase() === 'FINAL_OK?') {
           setAgentMessage('Checking if ready...');
@@ -1693,6 +1952,11 @@ Output one complete HTML file. After the HTML, request checks with [[DO:LINT]] a
             hint: 'Provide HTML.', 
             severity: 'error' as const 
           }];
+          if (latestHtml) {
+            lastLint = lintErrors;
+            lastQG = qgIssues;
+            roundLinted = roundQGChecked = true;
+          }
 
           const ready = lintErrors.length === 0 && qgIssues.filter(i => i.severity === 'error').length === 0;
           const status = {
@@ -1717,8 +1981,11 @@ Output one complete HTML file. After the HTML, request checks with [[DO:LINT]] a
         } else if (cmd === 'FINAL') {
           setAgentMessage('Finalizing...');
           if (latestHtml) {
-            const lintErrors = lintHtml(latestHtml || '');
-            const qgIssues = analyzeGeneralIssues(latestHtml || '');
+            const lintErrors = lintHtml(latestHtml);
+            const qgIssues = analyzeGeneralIssues(latestHtml);
+            lastLint = lintErrors;
+            lastQG = qgIssues;
+            roundLinted = roundQGChecked = true;
             if (lintErrors.length === 0 && qgIssues.filter(i => i.severity === 'error').length === 0) {
               console.log('Controller: Final accepted.');
               setAgentMessage('Complete! ✨');
@@ -1750,6 +2017,9 @@ Output one complete HTML file. After the HTML, request checks with [[DO:LINT]] a
         if (latestHtml) {
           const lintErrors = lintHtml(latestHtml);
           const qgIssues = analyzeGeneralIssues(latestHtml);
+          lastLint = lintErrors;
+          lastQG = qgIssues;
+          roundLinted = roundQGChecked = true;
           if (lintErrors.length === 0 && qgIssues.filter(i => i.severity === 'error').length === 0) {
             followups.push({ 
               role: 'user', 
@@ -1775,6 +2045,30 @@ Output one complete HTML file. After the HTML, request checks with [[DO:LINT]] a
 
       messages.push({ role: 'assistant', content: responseText });
       messages.push(...followups);
+
+      roundNotes.push({
+        lint: roundLinted ? lastLint.length : null,
+        qgErrors: roundQGChecked ? lastQG.filter(i => i.severity === 'error').length : null,
+        selfInstruction
+      });
+
+      // Keep the plan message (messages[0]) and everything from the round that produced
+      // the latest HTML; older rounds only carry superseded HTML and check results.
+      if (messages.length > MAX_HISTORY_MESSAGES && htmlRoundStart > 1) {
+        const condensed = roundNotes.slice(0, htmlRound - 1);
+        const latestSelf = condensed.map(n => n.selfInstruction).filter(Boolean).pop();
+        const condensedLabel = htmlRound === 2 ? 'Round 1' : `Rounds 1-${htmlRound - 1}`;
+        const summary = [
+          `[[SUMMARY]] ${condensedLabel} condensed; their HTML and check results are superseded by the latest HTML below.`,
+          ...condensed.map((n, i) =>
+            `- Round ${i + 1}: lint issues ${n.lint ?? 'not checked'}, QG errors ${n.qgErrors ?? 'not checked'}`),
+        ];
+        if (latestSelf) {
+          summary.push(`Latest self-instruction: ${latestSelf}`);
+        }
+        messages.splice(1, htmlRoundStart - 1, { role: 'user', content: summary.join('\n') });
+        htmlRoundStart = 2;
+      }
     }
 
     console.log('Controller: Reached max rounds without finalization. Returning latest HTML if available.');
@@ -1900,6 +2194,7 @@ ${errorReport}`;
   const resetCumulativeTokens = () => {
     setCumulativeTokens({
       prompt_tokens: 0,
+      cached_prompt_tokens: 0,
       completion_tokens: 0,
       total_tokens: 0,
     });
@@ -1955,6 +2250,7 @@ ${errorReport}`;
       console.log("🎯 CUMULATIVE TOKEN USAGE SUMMARY");
       console.log("=".repeat(60));
       console.log(`📝 Total Prompt Tokens:     ${cumulativeTokens.prompt_tokens.toLocaleString()}`);
+      console.log(`♻️ Cached Prompt Tokens:    ${cumulativeTokens.cached_prompt_tokens.toLocaleString()}`);
       console.log(`🤖 Total Completion Tokens: ${cumulativeTokens.completion_tokens.toLocaleString()}`);
       console.log(`💰 Total Tokens Used:       ${cumulativeTokens.total_tokens.toLocaleString()}`);
       console.log("=".repeat(60));